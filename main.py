@@ -1,143 +1,356 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import httpx
+import itertools
 from datetime import datetime
-import pytz
+import json
+import os
+import re
+import sys
+import time
+from typing import NamedTuple, Optional
 from urllib.parse import urljoin
+from zoneinfo import ZoneInfo
 import feedparser # Import the feedparser library
 
 # --- Configuration for websites to scrape ---
 # IMPORTANT: You MUST customize the 'selector' for each website if using direct scraping.
 # For RSS feeds, you provide the 'rss_url'.
-WEBSITE_CONFIGS = {
-    "The Globe and Mail": {
-        "url": "https://www.theglobeandmail.com/",
-        "selector": "h3.c-card__title a, h2.c-story-block__title a, h2.c-feature-block__headline-text a",
+class SiteConfig(NamedTuple):
+    """A news site to fetch: its homepage, the CSS selector for headline links, and an optional RSS feed."""
+    name: str
+    url: str
+    selector: str
+    rss_url: Optional[str] = None
+
+SITES = (
+    SiteConfig(
+        name="The Globe and Mail",
+        url="https://www.theglobeandmail.com/",
+        selector="h3.c-card__title a, h2.c-story-block__title a, h2.c-feature-block__headline-text a",
         # Find their RSS feed if available. Many news sites have them.
-        "rss_url": "https://www.theglobeandmail.com/arc/outboundfeeds/rss/category/"
+        rss_url="https://www.theglobeandmail.com/arc/outboundfeeds/rss/category/"
         # I'll leave this commented out as you'll need to find the exact RSS URL.
-    },
-     "The Star": {
-        "url": "https://thestar.com/",
-        "selector": "h3.article-card__title a, h2.entry-title a, .card-title a",
+    ),
+    SiteConfig(
+        name="The Star",
+        url="https://thestar.com/",
+        selector="h3.article-card__title a, h2.entry-title a, .card-title a",
         # Toronto Star RSS:
-        "rss_url": "https://www.thestar.com/search/?f=rss&t=article&bl=2827101&l=20" # Common RSS feed path
-    },
-    "Toronto Sun": {
-        "url": "https://torontosun.com/",
-        "selector": "h3.article-card__title a, h2.entry-title a, .card-title a",
+        rss_url="https://www.thestar.com/search/?f=rss&t=article&bl=2827101&l=20" # Common RSS feed path
+    ),
+    SiteConfig(
+        name="Toronto Sun",
+        url="https://torontosun.com/",
+        selector="h3.article-card__title a, h2.entry-title a, .card-title a",
         # Toronto Sun RSS:
-        "rss_url": "https://torontosun.com/feed" # Common RSS feed path
-    },
-    "National Post": {
-        "url": "https://nationalpost.com/",
-        "selector": "h3.article-card__title a, h2.entry-title a, .card-title a",
+        rss_url="https://torontosun.com/feed" # Common RSS feed path
+    ),
+    SiteConfig(
+        name="National Post",
+        url="https://nationalpost.com/",
+        selector="h3.article-card__title a, h2.entry-title a, .card-title a",
         # National Post RSS:
-        "rss_url": "https://nationalpost.com/feed" # Common RSS feed path
-    },
-    "CP24": {
-        "url": "https://www.cp24.com/",
-        "selector": "h2 a, h3 a, .c-posts-card__headline a, .c-list-card__headline a",
+        rss_url="https://nationalpost.com/feed" # Common RSS feed path
+    ),
+    SiteConfig(
+        name="CP24",
+        url="https://www.cp24.com/",
+        selector="h2 a, h3 a, .c-posts-card__headline a, .c-list-card__headline a",
         # CP24 has specific RSS feeds, e.g., for Toronto News:
-        "rss_url": "https://www.cp24.com/polopoly_fs/1.3789512!/menu/generic.xml"
-    },
-    "Ottawa Citizen": {
-        "url": "https://ottawacitizen.com/",
-        "selector": "h3.article-card__title a, h2.entry-title a, .card-title a",
+        rss_url="https://www.cp24.com/polopoly_fs/1.3789512!/menu/generic.xml"
+    ),
+    SiteConfig(
+        name="Ottawa Citizen",
+        url="https://ottawacitizen.com/",
+        selector="h3.article-card__title a, h2.entry-title a, .card-title a",
         # Ottawa Citizen RSS:
-        "rss_url": "https://ottawacitizen.com/feed" # Common RSS feed path
-    },
-    "Juno News": { # This one timed out, so RSS is a good candidate if available
-        "url": "https://junonews.com/",
-        "selector": "h3 a, a[data-testid='post-title-link']",
-        "rss_url": "https://www.junonews.com/feed"
-        
-    },
-    "Rebel News": {
-        "url": "https://www.rebelnews.com/news",
-        "selector": "h2.headline a, h3 a, .post-title a, .article-title a",
+        rss_url="https://ottawacitizen.com/feed" # Common RSS feed path
+    ),
+    SiteConfig( # This one timed out, so RSS is a good candidate if available
+        name="Juno News",
+        url="https://junonews.com/",
+        selector="h3 a, a[data-testid='post-title-link']",
+        rss_url="https://www.junonews.com/feed"
+    ),
+    SiteConfig(
+        name="Rebel News",
+        url="https://www.rebelnews.com/news",
+        selector="h2.headline a, h3 a, .post-title a, .article-title a",
         # Rebel News RSS:
-        "rss_url": "https://www.rebelnews.com/feed" # Common RSS feed path
-    },
-    "CBC News": {
-        "url": "https://www.cbc.ca/news",
-        "selector": "h3.gs-c-promo-heading__title a, h3.cbc-card__headline a, a.cbc-card__headline-link",
+        rss_url="https://www.rebelnews.com/feed" # Common RSS feed path
+    ),
+    SiteConfig(
+        name="CBC News",
+        url="https://www.cbc.ca/news",
+        selector="h3.gs-c-promo-heading__title a, h3.cbc-card__headline a, a.cbc-card__headline-link",
         # CBC News has regional and topic-specific feeds. General news:
-        "rss_url": "https://www.cbc.ca/cmlink/rss-topstories"
-    }
-}
+        rss_url="https://www.cbc.ca/cmlink/rss-topstories"
+    ),
+)
 
 # Add a User-Agent header to mimic a web browser for direct scraping
 HEADERS = {
     "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
 }
 
-def get_headlines_from_rss(rss_url):
+# Feeds and pages fetched less than this many seconds ago are served from the cache without a request
+CACHE_TTL = 60
+
+# Per-URL cache of validators and parsed headlines for RSS feeds and scraped pages:
+# {url: {"etag": ..., "last_modified": ..., "headlines": [...], "fetched_at": ..., "selector": ...}}
+# "selector" is the CSS selector a scraped page was parsed with (None for RSS feeds)
+_headline_cache = {}
+
+# The headline cache is saved here between runs so the next run can still send conditional GETs
+CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".headline_cache.json")
+
+def _valid_cache_entry(entry):
+    """Checks that a cache entry loaded from disk has the fields the fetchers and the report read."""
+    return (
+        isinstance(entry, dict)
+        and isinstance(entry.get("fetched_at"), (int, float))
+        and all(key in entry and isinstance(entry[key], (str, type(None))) for key in ("etag", "last_modified"))
+        and isinstance(entry.get("selector"), (str, type(None)))
+        and isinstance(entry.get("headlines"), list)
+        and all(
+            isinstance(h, dict) and isinstance(h.get("title"), str) and isinstance(h.get("link"), str)
+            for h in entry["headlines"]
+        )
+    )
+
+def load_headline_cache():
+    """Loads the headline cache saved by a previous run, if any, skipping entries that don't fit the expected shape."""
+    try:
+        with open(CACHE_FILE, encoding="utf-8") as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable headline cache {CACHE_FILE}: {e}")
+        return
+
+    if not isinstance(data, dict):
+        print(f"Ignoring malformed headline cache {CACHE_FILE}: expected an object, got {type(data).__name__}")
+        return
+    for url, entry in data.items():
+        if _valid_cache_entry(entry):
+            _headline_cache[url] = entry
+
+def save_headline_cache():
+    """Writes the headline cache to disk for the next run."""
+    # Write to a temporary file and swap it in, so concurrent runs never leave a truncated cache behind
+    tmp_path = f"{CACHE_FILE}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(_headline_cache, f)
+        os.replace(tmp_path, CACHE_FILE)
+    except OSError as e:
+        print(f"Error saving headline cache {CACHE_FILE}: {e}")
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+def _store_headlines(url, response, headlines, selector=None):
+    """Caches parsed headlines for a URL together with the response's validators and the selector used, if any."""
+    _headline_cache[url] = {
+        "etag": response.headers.get("ETag"),
+        "last_modified": response.headers.get("Last-Modified"),
+        "headlines": headlines,
+        "fetched_at": time.time(),
+        "selector": selector,
+    }
+
+def _conditional_headers(cached):
+    """Returns If-None-Match/If-Modified-Since headers from a cache entry if there is one."""
+    headers = {}
+    if cached:
+        if cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+    return headers
+
+# Number of headlines shown per site; parsing stops once this many have been collected
+HEADLINE_LIMIT = 10
+
+# Collapses runs of whitespace (newlines, indentation between nested tags) in scraped headline text
+_WS_RE = re.compile(r'\s+')
+
+# Headlines sit near the top of the page, so stop downloading a page after this many bytes
+MAX_PAGE_BYTES = 512 * 1024
+
+# Finds a <meta charset="..."> or http-equiv Content-Type charset declaration in the page head
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?([\w.:-]+)', re.IGNORECASE)
+
+def _decode_page(body, header_encoding):
+    """Decodes page bytes using the Content-Type charset, then a <meta> charset, then UTF-8."""
+    # Lexbor always reads bytes as UTF-8, so pages in other encodings must be decoded before parsing
+    encoding = header_encoding
+    if not encoding:
+        match = _META_CHARSET_RE.search(body, 0, 4096)
+        if match:
+            encoding = match.group(1).decode("ascii")
+    # errors="replace" also covers a multibyte character cut in half by MAX_PAGE_BYTES
+    try:
+        return body.decode(encoding or "utf-8", errors="replace")
+    except LookupError: # Unknown charset name
+        return body.decode("utf-8", errors="replace")
+
+async def _read_capped(response):
+    """Reads a streamed response body, stopping once MAX_PAGE_BYTES have been received."""
+    chunks = []
+    size = 0
+    async for chunk in response.aiter_bytes(chunk_size=64 * 1024):
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= MAX_PAGE_BYTES:
+            break
+    return b"".join(chunks)
+
+def parse_rss_headlines(rss_url, content, response_headers, limit=HEADLINE_LIMIT):
+    """Parses downloaded RSS feed bytes into at most `limit` headline dicts."""
+    feed = feedparser.parse(content, response_headers=response_headers)
+    if feed.bozo: # Check for parsing errors
+        print(f"Error parsing RSS feed {rss_url}: {feed.bozo_exception}")
+        return []
+
+    headlines = []
+    for entry in feed.entries:
+        title = entry.get('title', 'No Title').strip()
+        link = entry.get('link', 'No Link').strip()
+        if title and link:
+            headlines.append({"title": title, "link": link})
+            if len(headlines) >= limit:
+                break
+    return headlines
+
+def iter_page_headlines(body, url, selector):
+    """Yields unique headlines matching the CSS selector from page HTML, with links made absolute."""
+    # Imported here since scraping is only the fallback when RSS fails, so most runs never load the HTML parser
+    from selectolax.lexbor import LexborHTMLParser
+    # A truncated page may end mid-tag; Lexbor recovers like a browser would
+    tree = LexborHTMLParser(body)
+    seen = set() # The comma-separated selectors often match the same anchor more than once
+    for node in tree.css(selector):
+        text = _WS_RE.sub(' ', node.text()).strip()
+        link = node.attributes.get('href')
+        if text and link:
+            # Ensure the link is absolute
+            if not link.startswith(('http://', 'https://')):
+                link = urljoin(url, link)
+            key = (text, link)
+            if key in seen:
+                continue
+            seen.add(key)
+            yield {"title": text, "link": link}
+
+def parse_page_headlines(body, url, selector, limit=HEADLINE_LIMIT):
+    """Returns the first `limit` headlines from iter_page_headlines; matches past the limit are never processed."""
+    return list(itertools.islice(iter_page_headlines(body, url, selector), limit))
+
+async def get_headlines_from_rss(client, rss_url):
     """Fetches headlines from an RSS feed."""
+    cached = _headline_cache.get(rss_url)
+    if cached and time.time() - cached["fetched_at"] < CACHE_TTL:
+        return cached["headlines"]
+
     try:
-        feed = feedparser.parse(rss_url)
-        if feed.bozo: # Check for parsing errors
-            print(f"Error parsing RSS feed {rss_url}: {feed.bozo_exception}")
-            return []
-
-        headlines = []
-        for entry in feed.entries:
-            title = entry.get('title', 'No Title').strip()
-            link = entry.get('link', 'No Link').strip()
-            if title and link:
-                headlines.append({"title": title, "link": link})
+        # Download through the shared client (pooled connection, timeout) and let feedparser parse the bytes;
+        # passing the response headers keeps feedparser's charset detection working
+        response = await client.get(rss_url, headers=_conditional_headers(cached))
+        if response.status_code == 304 and cached: # Feed unchanged, reuse the parsed headlines
+            cached["fetched_at"] = time.time()
+            return cached["headlines"]
+        response.raise_for_status()
+        # Parsing is CPU-bound, so run it in the default thread pool to keep the other sites' downloads moving
+        headlines = await asyncio.to_thread(parse_rss_headlines, rss_url, response.content, dict(response.headers))
+        if headlines: # A failed feed falls back to scraping, so only cache feeds that produced headlines
+            _store_headlines(rss_url, response, headlines)
         return headlines
     except Exception as e:
         print(f"Error fetching RSS feed {rss_url}: {e}")
         return []
 
-def get_headlines_from_scrape(url, selector):
+async def get_headlines_from_scrape(client, url, selector):
     """Fetches headlines from a given URL using the specified CSS selector (direct scraping)."""
+    cached = _headline_cache.get(url)
+    if cached and cached.get("selector") != selector:
+        # Parsed with a different selector (e.g. after tuning it), so neither the headlines nor the validators apply
+        cached = None
+    if cached and time.time() - cached["fetched_at"] < CACHE_TTL:
+        return cached["headlines"]
+
     try:
-        response = requests.get(url, headers=HEADERS, timeout=15) # Increased timeout
-        response.raise_for_status()  # Raise an HTTPError for bad responses (4xx or 5xx)
-        soup = BeautifulSoup(response.content, 'html.parser')
-        headlines = []
-        for element in soup.select(selector):
-            text = element.get_text(strip=True)
-            link = element.get('href')
-            if text and link:
-                # Ensure the link is absolute
-                if not link.startswith(('http://', 'https://')):
-                    link = urljoin(url, link)
-                headlines.append({"title": text, "link": link})
+        async with client.stream("GET", url, headers=_conditional_headers(cached)) as response:
+            if response.status_code == 304 and cached: # Page unchanged, reuse the parsed headlines
+                cached["fetched_at"] = time.time()
+                return cached["headlines"]
+            response.raise_for_status()  # Raise an HTTPError for bad responses (4xx or 5xx)
+            body = await _read_capped(response)
+        html = _decode_page(body, response.charset_encoding)
+        headlines = await asyncio.to_thread(parse_page_headlines, html, url, selector)
+        if headlines: # An empty result usually means a stale selector, so don't serve it back from the cache
+            _store_headlines(url, response, headlines, selector)
         return headlines
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Error fetching {url}: {e}")
         return []
 
-def main():
+async def get_site_headlines(client, site):
+    """Gets headlines for one site, trying its RSS feed first and falling back to direct scraping."""
+    if site.rss_url:
+        print(f"Attempting to fetch {site.name} from RSS: {site.rss_url}")
+        headlines = await get_headlines_from_rss(client, site.rss_url)
+        if headlines:
+            return headlines
+        print(f"RSS feed for {site.name} returned no headlines or failed. Falling back to direct scraping.")
+    else:
+        print(f"No RSS URL configured for {site.name}. Proceeding with direct scraping.")
+    return await get_headlines_from_scrape(client, site.url, site.selector)
+
+async def main():
     """Main function to get headlines from configured websites, prioritizing RSS."""
     print("--- Canadian News Headlines (Mississauga, ON Perspective) ---")
 
-    eastern_tz = pytz.timezone('America/New_York')
+    eastern_tz = ZoneInfo('America/New_York')
     current_time_et = datetime.now(eastern_tz).strftime("%Y-%m-%d %H:%M:%S %Z%z")
     print(f"Current Time (ET): {current_time_et}\n")
 
-    for site_name, config in WEBSITE_CONFIGS.items():
-        print(f"--- {site_name} ---")
-        headlines = []
+    load_headline_cache()
 
-        if "rss_url" in config and config["rss_url"]:
-            print(f"Attempting to fetch from RSS: {config['rss_url']}")
-            headlines = get_headlines_from_rss(config["rss_url"])
-            if not headlines:
-                print(f"RSS feed for {site_name} returned no headlines or failed. Falling back to direct scraping.")
-                headlines = get_headlines_from_scrape(config["url"], config["selector"])
-        else:
-            print(f"No RSS URL configured for {site_name}. Proceeding with direct scraping.")
-            headlines = get_headlines_from_scrape(config["url"], config["selector"])
+    # All sites are fetched concurrently over one pooled client, so total time is the slowest site rather than the sum
+    # The pool keeps one keep-alive connection per site. No custom transport is passed, since that would
+    # stop httpx from honouring HTTP(S)_PROXY/ALL_PROXY from the environment.
+    # HTTP/2 lets hosts that support it multiplex the feed and page requests over a single TLS connection.
+    async with httpx.AsyncClient(
+        http2=True,
+        headers=HEADERS,
+        timeout=15,
+        follow_redirects=True,
+        limits=httpx.Limits(max_keepalive_connections=len(SITES), max_connections=2 * len(SITES)),
+    ) as client:
+        results = await asyncio.gather(
+            *(get_site_headlines(client, site) for site in SITES),
+            return_exceptions=True,
+        )
+    save_headline_cache()
+
+    # Build the whole report first and write it once rather than printing line by line
+    out = [""]
+    for site, headlines in zip(SITES, results):
+        out.append(f"--- {site.name} ---")
+        if isinstance(headlines, Exception):
+            out.append(f"Error fetching headlines for {site.name}: {headlines}")
+            headlines = []
 
         if headlines:
-            for i, headline in enumerate(headlines[:10]):
-                print(f"{i+1}. {headline['title']} ({headline['link']})")
+            for i, headline in enumerate(headlines):
+                out.append(f"{i+1}. {headline['title']} ({headline['link']})")
         else:
-            print(f"No headlines found or an error occurred for {site_name}.")
-        print("\n")
+            out.append(f"No headlines found or an error occurred for {site.name}.")
+        out.append("\n")
+    sys.stdout.write("\n".join(out) + "\n")
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())